@@ -1,17 +1,17 @@
 import os
-import base64
+import binascii
 import io
+import hashlib
 import ttkbootstrap as tb
 from ttkbootstrap.constants import *
 from tkinter import messagebox, Text, Canvas, Frame, Toplevel
 from PIL import Image, ImageTk
-from pathlib import Path
 import pyperclip  # pip install pyperclip
 
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
 from datetime import datetime
 import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 selected_xray_global = None
 
@@ -19,22 +19,116 @@ import request_create_json as r
 import perplexity_ai_client as pr
 
 
-def decode_image(file_info):
-    file_data = file_info.get("fileData")
-    if not file_data:
-        return None
+def read_image_bytes(file_info):
+    """Return the encoded image bytes from a filePath or base64 fileData entry."""
     try:
-        file_bytes = base64.b64decode(file_data)
-        return Image.open(io.BytesIO(file_bytes))
+        if "filePath" in file_info:
+            # One read per file so PIL decodes from memory instead of
+            # issuing many small reads against the open file handle
+            with open(file_info["filePath"], "rb") as f:
+                return f.read()
+        file_data = file_info.get("fileData")
+        # a2b_base64 skips b64decode's Python-level argument normalization; accepts str or bytes
+        return binascii.a2b_base64(file_data) if file_data else None
     except Exception:
         return None
 
 
-def decode_image_from_path(file_path):
+def open_image_bytes(file_bytes, draft_size=None):
     try:
-        return Image.open(file_path)
+        img = Image.open(io.BytesIO(file_bytes))
     except Exception:
         return None
+    if draft_size:
+        # JPEGs decode at a 1/2..1/8 DCT scale no smaller than draft_size; no-op for PNG
+        try:
+            img.draft(None, draft_size)
+        except Exception:
+            pass
+    return img
+
+
+def decode_image(file_info, draft_size=None):
+    file_bytes = read_image_bytes(file_info)
+    if not file_bytes:
+        return None
+    return open_image_bytes(file_bytes, draft_size)
+
+
+def decode_image_from_path(file_path, draft_size=None):
+    return decode_image({"filePath": file_path}, draft_size)
+
+
+# first_text.txt asks for a short answer (a few sentences); 400 tokens leaves room for
+# bullets and ICD-10 codes while capping generation time well below the client's 1000
+AI_MAX_TOKENS = 400
+
+THUMBNAIL_DIR = ".thumbs"
+THUMBNAIL_CACHE_SIZE = 512
+# LRU of decoded thumbnails, shared by the thumbnail pool threads
+thumbnail_cache = OrderedDict()
+thumbnail_cache_lock = threading.Lock()
+
+
+def resize_to_fit(img, max_width, max_height, resample=Image.Resampling.LANCZOS, reducing_gap=2.0):
+    # reducing_gap box-shrinks by an integer factor first, so the resampling kernel
+    # only runs over a few times the target pixel count instead of the full X-ray
+    width, height = img.size
+    ratio = min(max_width / width, max_height / height)
+    new_size = (int(width * ratio), int(height * ratio))
+    return img.resize(new_size, resample, reducing_gap=reducing_gap)
+
+
+def save_thumbnail(thumbnail, cache_path, file_name):
+    """Write a thumbnail to the on-disk cache, dropping stale versions of the same file."""
+    cache_dir, cache_name = os.path.split(cache_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for entry in os.listdir(cache_dir):
+            if entry.startswith(file_name + ".") and entry != cache_name:
+                os.remove(os.path.join(cache_dir, entry))
+        thumbnail.save(cache_path, "PNG")
+    except OSError as e:
+        print(f"Could not cache thumbnail {cache_path}: {e}")
+
+
+def make_thumbnail(file_info, max_width=120, max_height=100):
+    """Return a gallery thumbnail for the image, or None if it can't be decoded; runs off the Tk thread."""
+    file_bytes = read_image_bytes(file_info)
+    if not file_bytes:
+        return None
+
+    # Keyed by content, not mtime: every fetch rewrites the image files with the same
+    # bytes, so only a digest still matches on the next fetch or restart
+    digest = hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+    key = f"{digest}_{max_width}x{max_height}"
+
+    with thumbnail_cache_lock:
+        thumbnail = thumbnail_cache.get(key)
+        if thumbnail is not None:
+            thumbnail_cache.move_to_end(key)
+    if thumbnail is None:
+        cache_path = None
+        if "filePath" in file_info:
+            folder, file_name = os.path.split(file_info["filePath"])
+            cache_path = os.path.join(folder, THUMBNAIL_DIR, f"{file_name}.{key}.png")
+            if os.path.exists(cache_path):
+                thumbnail = decode_image_from_path(cache_path)
+                if thumbnail is not None:
+                    thumbnail.load()
+        if thumbnail is None:
+            img = open_image_bytes(file_bytes, (max_width * 2, max_height * 2))
+            if img is None:
+                return None
+            thumbnail = resize_to_fit(img, max_width, max_height)
+            if cache_path:
+                save_thumbnail(thumbnail, cache_path, file_name)
+        with thumbnail_cache_lock:
+            thumbnail_cache[key] = thumbnail
+            thumbnail_cache.move_to_end(key)
+            while len(thumbnail_cache) > THUMBNAIL_CACHE_SIZE:
+                thumbnail_cache.popitem(last=False)
+    return thumbnail
 
 
 class HealthcareApp(tb.Window):
@@ -49,6 +143,22 @@ class HealthcareApp(tb.Window):
         self.image_thumbnails = {}
         self.selected_xray = None
         self.patient_folder = None
+        self.patient_json_path = None
+        self.patient_id = None
+        self.preview_img = None
+        # Only the newest fetch may install its results; also keeps two fetches from writing at once
+        self._fetch_generation = 0
+        self._fetch_lock = threading.Lock()
+        # PIL releases the GIL while decoding/resizing, so thumbnails scale across cores
+        self.thumbnail_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+        self._pending_scroll = 0
+        self._scroll_scheduled = False
+        self.gallery_canvas = None
+        self.gallery_tiles = []
+        self._gallery_refresh_scheduled = False
+        self._ai_placeholder = False
+        # Bumped per Submit and per workflow rebuild; AI callbacks from an older request are dropped
+        self._ai_generation = 0
 
         # Patient ID input
         tb.Label(self, text="Enter Patient ID:", bootstyle=INFO).pack(pady=10)
@@ -77,8 +187,9 @@ class HealthcareApp(tb.Window):
         self.canvas.pack(side="left", fill="both", expand=True, padx=10, pady=10)
         self.scrollbar.pack(side="right", fill="y")
 
-        # Mouse wheel scrolling
-        self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
+        # Mouse wheel scrolling; bound on this window's tag rather than bind_all so only
+        # widgets inside the main window feed it (and Text widgets can "break" out)
+        self.bind("<MouseWheel>", self._on_mousewheel)
 
         # Keep content centered when resizing
         def _center_content(event):
@@ -88,7 +199,18 @@ class HealthcareApp(tb.Window):
         self.canvas.bind("<Configure>", _center_content)
 
     def _on_mousewheel(self, event):
-        self.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
+        # Coalesce a burst of wheel ticks into one scroll per idle cycle
+        self._pending_scroll += event.delta
+        if not self._scroll_scheduled:
+            self._scroll_scheduled = True
+            self.after_idle(self._flush_scroll)
+
+    def _flush_scroll(self):
+        units = int(-1 * (self._pending_scroll / 120))
+        self._pending_scroll = 0
+        self._scroll_scheduled = False
+        if units:
+            self.canvas.yview_scroll(units, "units")
 
     # --- NEW: Independent scroll binding for Text widgets ---
     def _bind_text_scroll(self, text_widget):
@@ -96,8 +218,7 @@ class HealthcareApp(tb.Window):
             text_widget.yview_scroll(int(-1 * (event.delta / 120)), "units")
             return "break"  # stop main canvas from scrolling
 
-        text_widget.bind("<Enter>", lambda e: text_widget.bind_all("<MouseWheel>", _on_mousewheel))
-        text_widget.bind("<Leave>", lambda e: text_widget.bind_all("<MouseWheel>", self._on_mousewheel))
+        text_widget.bind("<MouseWheel>", _on_mousewheel)
 
     # --- Async fetch wrapper ---
     def fetch_patient_async(self):
@@ -105,87 +226,77 @@ class HealthcareApp(tb.Window):
         if not pid:
             messagebox.showwarning("Input Error", "Please enter a patient ID")
             return
-        threading.Thread(target=lambda: self._safe_fetch(pid), daemon=True).start()
-
-    def _safe_fetch(self, pid):
+        # Forget the previous patient so nothing stale can be submitted or reported
+        global selected_xray_global
+        self._fetch_generation += 1
+        self.patient_data = None
+        self.patient_folder = None
+        self.patient_json_path = None
+        self.patient_id = None
+        self.selected_xray = selected_xray_global = None
+        self.preview_img = None
+
+        # Show the forms right away; the gallery fills in once the fetch lands.
+        # Submit and PDF stay disabled until then
+        self.build_workflow()
+        self._set_patient_actions("disabled")
+        threading.Thread(target=self._safe_fetch, args=(pid, self._fetch_generation), daemon=True).start()
+
+    def _safe_fetch(self, pid, generation):
         try:
-            self.patient_data = r.get_patient(pid)
-            self.patient_folder = r.save_patient_data(self.patient_data)
-            self.after(0, self.build_workflow)
-            self.after(0, lambda: messagebox.showinfo("Success", "Patient data retrieved."))
+            with self._fetch_lock:
+                patient_data = r.get_patient(pid)
+                patient_folder = r.save_patient_data(patient_data)
+                json_path = r.path
+            self.after(0, self._finish_fetch, generation, pid, patient_data, patient_folder, json_path)
         except Exception as e:
-            self.after(0, lambda: messagebox.showerror("Error", f"Failed to fetch patient: {e}"))
+            self.after(0, self._fail_fetch, generation, str(e))
+
+    def _finish_fetch(self, generation, pid, patient_data, patient_folder, json_path):
+        if generation != self._fetch_generation:
+            return
+        self.patient_data = patient_data
+        self.patient_folder = patient_folder
+        self.patient_json_path = json_path
+        self.patient_id = pid
+        self.populate_gallery()
+        if patient_folder:
+            self._set_patient_actions("normal")
+        messagebox.showinfo("Success", "Patient data retrieved.")
+
+    def _fail_fetch(self, generation, message):
+        if generation != self._fetch_generation:
+            return
+        self.populate_gallery()
+        messagebox.showerror("Error", f"Failed to fetch patient: {message}")
+
+    def _set_patient_actions(self, state):
+        self.submit_btn.config(state=state)
+        self.pdf_btn.config(state=state)
 
     def copy_relative_path(self, file_path, base_dir=None):
-        file_path = Path(file_path).resolve()
-        base_dir = Path(base_dir).resolve() if base_dir else Path.cwd()
+        # Pure string math; paths outside base_dir come back with ".." instead of failing
         try:
-            relative_path = file_path.relative_to(base_dir)
-            pyperclip.copy(str(relative_path))
-            print(f"Copied to clipboard: {relative_path}")
-            return str(relative_path)
+            relative_path = os.path.relpath(os.fspath(file_path), os.fspath(base_dir or os.getcwd()))
         except ValueError:
-            print("Error: File is not within the base directory")
-            return None
+            # On Windows there is no relative path between drives; copy the absolute one
+            relative_path = os.path.abspath(file_path)
+        pyperclip.copy(relative_path)
+        print(f"Copied to clipboard: {relative_path}")
+        return relative_path
 
     def build_workflow(self):
+        self._ai_generation += 1  # orphan any AI request still writing into the old form
         for widget in self.scrollable_frame.winfo_children():
             widget.destroy()
 
-        self.xrays = []
-        if self.patient_folder and os.path.exists(self.patient_folder):
-            for file_name in os.listdir(self.patient_folder):
-                if file_name.lower().endswith(".png"):
-                    file_path = os.path.join(self.patient_folder, file_name)
-                    self.xrays.append((file_name, {"filePath": file_path}))
-
-        if self.xrays:
-            tb.Label(self.scrollable_frame, text="Select X-ray (click on an image):", bootstyle=PRIMARY).pack(pady=5)
-
-            gallery_frame = Frame(self.scrollable_frame)
-            gallery_frame.pack(pady=5)
-
-            canvas = Canvas(gallery_frame, height=160)
-            scrollbar = tb.Scrollbar(gallery_frame, orient="horizontal", command=canvas.xview)
-            scrollable_frame = Frame(canvas)
-
-            scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-            canvas.create_window((0, 0), window=scrollable_frame, anchor="n")
-            canvas.configure(xscrollcommand=scrollbar.set)
-
-            canvas.bind_all("<Shift-MouseWheel>", lambda e: canvas.xview_scroll(int(-1 * (e.delta / 120)), "units"))
-
-            self.image_thumbnails = {}
-            column_index = 0
-            for file_name, file_info in self.xrays:
-                if file_name.lower().endswith('.dcm'):
-                    continue
-
-                img_frame = Frame(scrollable_frame)
-                img_frame.grid(row=0, column=column_index, padx=10, pady=5)
-
-                tb.Label(img_frame, text=file_name, bootstyle=SECONDARY).pack()
-
-                img = decode_image_from_path(file_info["filePath"]) if "filePath" in file_info else decode_image(file_info)
-                if img:
-                    width, height = img.size
-                    ratio = min(120 / width, 100 / height)
-                    new_size = (int(width * ratio), int(height * ratio))
-                    thumbnail = img.resize(new_size, Image.Resampling.LANCZOS)
-                    tk_thumbnail = ImageTk.PhotoImage(thumbnail)
-                    self.image_thumbnails[file_name] = (tk_thumbnail, img)
-
-                    img_label = tb.Label(img_frame, image=tk_thumbnail, cursor="hand2")
-                    img_label.pack()
-                    img_label.bind("<Button-1>", lambda e, name=file_name: self.show_xray(name))
-
-                column_index += 1
-
-            canvas.pack(side="top", fill="x", expand=True)
-            scrollbar.pack(side="bottom", fill="x")
-
-            self.xray_preview = tb.Label(self.scrollable_frame, text="No X-ray selected", bootstyle=SECONDARY)
-            self.xray_preview.pack(pady=10)
+        # Placeholder for the X-ray gallery, filled by populate_gallery
+        self.gallery_container = Frame(self.scrollable_frame)
+        self.gallery_container.pack(pady=5, fill="x")
+        tb.Label(self.gallery_container, text="Loading X-rays...", bootstyle=SECONDARY).pack(pady=5)
+        spinner = tb.Progressbar(self.gallery_container, mode="indeterminate", bootstyle=INFO)
+        spinner.pack(pady=5)
+        spinner.start()
 
         # --- Assumptions input with scrollbar ---
         tb.Label(self.scrollable_frame, text="Assumptions & Diagnosis:", bootstyle=PRIMARY).pack(pady=5)
@@ -213,7 +324,8 @@ class HealthcareApp(tb.Window):
         self.entry_questions.configure(yscrollcommand=questions_scroll.set)
         self._bind_text_scroll(self.entry_questions)
 
-        tb.Button(self.scrollable_frame, text="Submit", bootstyle=SUCCESS, command=self.submit_data).pack(pady=15)
+        self.submit_btn = tb.Button(self.scrollable_frame, text="Submit", bootstyle=SUCCESS, command=self.submit_data)
+        self.submit_btn.pack(pady=15)
 
         tb.Label(self.scrollable_frame, text="AI Assistant Output:", bootstyle=PRIMARY).pack(pady=5)
         output_frame = Frame(self.scrollable_frame)
@@ -226,8 +338,113 @@ class HealthcareApp(tb.Window):
         v_scroll.pack(side="right", fill="y")
         self.output_text.configure(yscrollcommand=v_scroll.set)
 
-        tb.Button(self.scrollable_frame, text="Generate PDF Report", bootstyle=INFO,
-                  command=self.generate_pdf_report).pack(pady=15)
+        self.pdf_btn = tb.Button(self.scrollable_frame, text="Generate PDF Report", bootstyle=INFO,
+                                 command=self.generate_pdf_report)
+        self.pdf_btn.pack(pady=15)
+
+    def populate_gallery(self):
+        for widget in self.gallery_container.winfo_children():
+            widget.destroy()
+
+        self.xrays = []
+        if self.patient_folder and os.path.isdir(self.patient_folder):
+            # DirEntry carries the joined path and cached file type, so no extra stat/join per entry
+            with os.scandir(self.patient_folder) as entries:
+                self.xrays = [(entry.name, {"filePath": entry.path}) for entry in entries
+                              if entry.is_file() and entry.name.lower().endswith(".png")]
+
+        if self.xrays:
+            tb.Label(self.gallery_container, text="Select X-ray (click on an image):", bootstyle=PRIMARY).pack(pady=5)
+
+            gallery_frame = Frame(self.gallery_container)
+            gallery_frame.pack(pady=5)
+
+            canvas = Canvas(gallery_frame, height=160)
+            scrollbar = tb.Scrollbar(gallery_frame, orient="horizontal", command=canvas.xview)
+            scrollable_frame = Frame(canvas)
+
+            scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
+            canvas.create_window((0, 0), window=scrollable_frame, anchor="n")
+            # Every view change (scroll, resize, new content) re-checks which tiles need an image
+            canvas.configure(xscrollcommand=lambda first, last: (scrollbar.set(first, last),
+                                                                 self._schedule_gallery_refresh()))
+            canvas.bind("<Configure>", lambda e: self._schedule_gallery_refresh())
+
+            self.bind("<Shift-MouseWheel>", lambda e: canvas.xview_scroll(int(-1 * (e.delta / 120)), "units"))
+
+            self.image_thumbnails = {}
+            self.gallery_canvas = canvas
+            self.gallery_tiles = []
+            column_index = 0
+            for file_name, file_info in self.xrays:
+                img_frame = Frame(scrollable_frame)
+                img_frame.grid(row=0, column=column_index, padx=10, pady=5)
+
+                tb.Label(img_frame, text=file_name, bootstyle=SECONDARY).pack()
+
+                # Images are attached lazily by _refresh_gallery once the tile nears the viewport
+                self.gallery_tiles.append({"name": file_name, "info": file_info, "frame": img_frame,
+                                           "label": None, "future": None})
+
+                column_index += 1
+
+            canvas.pack(side="top", fill="x", expand=True)
+            scrollbar.pack(side="bottom", fill="x")
+
+            self.xray_preview = tb.Label(self.gallery_container, text="No X-ray selected", bootstyle=SECONDARY)
+            self.xray_preview.pack(pady=10)
+
+    def _schedule_gallery_refresh(self):
+        if not self._gallery_refresh_scheduled:
+            self._gallery_refresh_scheduled = True
+            self.after_idle(self._refresh_gallery)
+
+    def _refresh_gallery(self):
+        """Load thumbnails for tiles within a viewport of the visible area and release the rest."""
+        self._gallery_refresh_scheduled = False
+        canvas = self.gallery_canvas
+        if canvas is None or not canvas.winfo_exists() or not canvas.winfo_ismapped():
+            return  # the <Configure> on first map triggers another refresh
+
+        view_width = canvas.winfo_width()
+        left = canvas.winfo_rootx() - view_width
+        right = canvas.winfo_rootx() + 2 * view_width
+        for tile in self.gallery_tiles:
+            frame = tile["frame"]
+            x = frame.winfo_rootx()
+            if x + frame.winfo_width() >= left and x <= right:
+                if tile["future"] is None:
+                    # Decode + resize in the pool; the tile is filled in on the Tk thread
+                    future = self.thumbnail_pool.submit(make_thumbnail, tile["info"])
+                    tile["future"] = future
+                    future.add_done_callback(lambda f, tile=tile: self.after(0, self._install_thumbnail, tile, f))
+            elif tile["future"] is not None:
+                if tile["label"] is not None:
+                    tile["label"].destroy()
+                    tile["label"] = None
+                tile["future"] = None
+                self.image_thumbnails.pop(tile["name"], None)
+
+    def _install_thumbnail(self, tile, future):
+        if future is not tile["future"] or not tile["frame"].winfo_exists():
+            return  # tile scrolled away or gallery was rebuilt before this finished
+
+        try:
+            thumbnail = future.result()
+        except Exception as e:
+            # A failed worker just leaves this tile without an image
+            print(f"Thumbnail failed for {tile['name']}: {e}")
+            thumbnail = None
+        if thumbnail:
+            file_name = tile["name"]
+            tk_thumbnail = ImageTk.PhotoImage(thumbnail)
+            # Keep only the small thumbnail; the full X-ray is re-read on selection
+            self.image_thumbnails[file_name] = (tk_thumbnail, tile["info"])
+
+            img_label = tb.Label(tile["frame"], image=tk_thumbnail, cursor="hand2")
+            img_label.pack()
+            img_label.bind("<Button-1>", lambda e, name=file_name: self.show_xray(name))
+            tile["label"] = img_label
 
     def show_xray(self, selected_file):
         if not selected_file:
@@ -236,14 +453,19 @@ class HealthcareApp(tb.Window):
 
         chosen_file_info = next((f for n, f in self.xrays if n == selected_file), None)
         if chosen_file_info and selected_file in self.image_thumbnails:
-            _, full_img = self.image_thumbnails[selected_file]
+            full_img = decode_image(chosen_file_info)
+            if full_img is None:
+                return
             self.preview_img = full_img
 
-            width, height = full_img.size
-            ratio = min(400 / width, 400 / height)
-            new_size = (int(width * ratio), int(height * ratio))
-            preview_img = full_img.resize(new_size, Image.Resampling.LANCZOS)
-            self.tk_preview = ImageTk.PhotoImage(preview_img)
+            # BILINEAR is plenty for a 400px preview; full-res stays in open_full_image
+            preview_img = resize_to_fit(full_img, 400, 400, Image.Resampling.BILINEAR, reducing_gap=3.0)
+            # Studies are usually uniform in size, so repaint the existing Tk image in place
+            # rather than allocating a new one on every click
+            if self.tk_preview is not None and (self.tk_preview.width(), self.tk_preview.height()) == preview_img.size:
+                self.tk_preview.paste(preview_img)
+            else:
+                self.tk_preview = ImageTk.PhotoImage(preview_img)
 
             self.xray_preview.config(image=self.tk_preview, text=f"Selected: {selected_file}")
             self.xray_preview.bind("<Button-1>", self.open_full_image)
@@ -277,26 +499,77 @@ class HealthcareApp(tb.Window):
             messagebox.showwarning("Input Error", "Please select an X-ray")
             return
 
-        image_path = os.path.join(r.image, self.selected_xray)
-        prompt = {
-            "requirements": r.instructions,
-            "patient_data": r.analyze_json(),
-            "opinion": assumptions,
-            "question": questions
-        }
+        image_path = os.path.join(self.patient_folder, self.selected_xray)
+        # Everything patient-specific is read here on the Tk thread, before a new fetch can move it
         try:
-            ai_response = pr.send_to_perplexity_ai(prompt, image_path)
-            self.output_text.delete("1.0", "end")
-            self.output_text.insert("1.0", ai_response)
-            self.bell()  # system beep instead of popup
+            prompt = {
+                "requirements": r.instructions,
+                "patient_data": r.analyze_json(self.patient_json_path),
+                "opinion": assumptions,
+                "question": questions
+            }
         except Exception as e:
             messagebox.showerror("Error", str(e))
+            return
+
+        # One request at a time; the button comes back when the response lands
+        self._ai_generation += 1
+        request = (self._ai_generation, self.output_text, self.submit_btn)
+        self.submit_btn.config(state="disabled")
+        self.output_text.delete("1.0", "end")
+        self.output_text.insert("1.0", "Waiting for AI response...")
+        self._ai_placeholder = True
+        threading.Thread(target=self._run_ai, args=(request, prompt, image_path, self.patient_id), daemon=True).start()
+
+    def _run_ai(self, request, prompt, image_path, patient_id):
+        try:
+            # Stream the answer into the output box as it is generated
+            ai_response = pr.send_to_perplexity_ai(
+                prompt, image_path, max_tokens=AI_MAX_TOKENS, patient_id=patient_id, on_delta=lambda delta: self.after(0, self._append_ai_delta, request, delta))
+            self.after(0, self._show_ai_response, request, ai_response)
+        except Exception as e:
+            self.after(0, self._show_ai_error, request, str(e))
+
+    def _ai_request_current(self, request):
+        generation, output_text, _ = request
+        return generation == self._ai_generation and output_text.winfo_exists()
+
+    def _append_ai_delta(self, request, delta):
+        if not self._ai_request_current(request):
+            return
+        _, output_text, _ = request
+        if self._ai_placeholder:
+            output_text.delete("1.0", "end")
+            self._ai_placeholder = False
+        output_text.insert("end", delta)
+        output_text.see("end")
+
+    def _show_ai_response(self, request, ai_response):
+        if not self._ai_request_current(request):
+            return
+        _, output_text, submit_btn = request
+        submit_btn.config(state="normal")
+        output_text.delete("1.0", "end")
+        output_text.insert("1.0", ai_response)
+        self.bell()  # system beep instead of popup
+
+    def _show_ai_error(self, request, message):
+        if not self._ai_request_current(request):
+            return
+        _, output_text, submit_btn = request
+        submit_btn.config(state="normal")
+        output_text.delete("1.0", "end")
+        messagebox.showerror("Error", message)
 
     def generate_pdf_report(self):
         if not self.patient_data or not self.selected_xray:
             messagebox.showwarning("Error", "Please fetch patient data and select an X-ray first.")
             return
 
+        # reportlab is only needed here, so keep it off the app's startup path
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+
         report_path = os.path.join(os.getcwd(), "Report_patient.pdf")
         try:
             c = canvas.Canvas(report_path, pagesize=A4)
@@ -307,24 +580,35 @@ class HealthcareApp(tb.Window):
             def draw_wrapped_text(c, text, x, y, max_width, font="Helvetica", size=12, leading=14, spacing_after=10):
                 """Draw text with word wrapping, return new y position."""
                 from reportlab.pdfbase.pdfmetrics import stringWidth
-                c.setFont(font, size)
+                # One TextObject (a single BT/ET block) per page instead of a
+                # positioned drawString operator per line
+                text_obj = c.beginText(x, y)
+                text_obj.setFont(font, size, leading)
                 words = text.split()
-                line = ""
+                # Measure each word once and keep a running width, instead of
+                # re-measuring the whole growing line for every word
+                space_width = stringWidth(" ", font, size)
+                line, line_width = [], 0.0
                 for word in words:
-                    test_line = line + ("" if line == "" else " ") + word
-                    if stringWidth(test_line, font, size) <= max_width:
-                        line = test_line
+                    word_width = stringWidth(word, font, size)
+                    test_width = line_width + (space_width if line else 0.0) + word_width
+                    if test_width <= max_width:
+                        line.append(word)
+                        line_width = test_width
                     else:
-                        c.drawString(x, y, line)
+                        text_obj.textLine(" ".join(line))
                         y -= leading
                         if y < margin:  # start new page
+                            c.drawText(text_obj)
                             c.showPage()
-                            c.setFont(font, size)
                             y = height - margin
-                        line = word
+                            text_obj = c.beginText(x, y)
+                            text_obj.setFont(font, size, leading)
+                        line, line_width = [word], word_width
                 if line:
-                    c.drawString(x, y, line)
+                    text_obj.textLine(" ".join(line))
                     y -= leading
+                c.drawText(text_obj)
                 return y - spacing_after
 
             # --- Report content ---
@@ -359,10 +643,15 @@ class HealthcareApp(tb.Window):
 
             # --- Image on next page ---
             c.showPage()
-            img_path = os.path.join(r.image, self.selected_xray)
+            img_path = os.path.join(self.patient_folder, self.selected_xray)
             if os.path.exists(img_path):
-                img = Image.open(img_path)
-                aspect = img.height / img.width
+                # Only the dimensions are needed; drawImage does its own single decode
+                if getattr(self, "preview_img", None) is not None:
+                    img_w, img_h = self.preview_img.size
+                else:
+                    with Image.open(img_path) as img:
+                        img_w, img_h = img.size
+                aspect = img_h / img_w
                 img_width = width - 2*margin
                 img_height = img_width * aspect
                 c.drawImage(img_path, margin, height - img_height - margin,
@@ -1,33 +1,62 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 import pydicom
 import numpy as np
 from PIL import Image
 
+# Image Pixel module attributes that pixel_array needs; everything else is skipped
+PIXEL_TAGS = [
+    "SamplesPerPixel", "PhotometricInterpretation", "Rows", "Columns", "BitsAllocated",
+    "BitsStored", "HighBit", "PixelRepresentation", "PlanarConfiguration", "NumberOfFrames",
+    "PixelData",
+]
+
+def convert_dicom(dicom_path, output_folder):
+    filename = os.path.basename(dicom_path)
+    try:
+        # Read DICOM, parsing only the pixel tags; large values are loaded on access
+        dcm = pydicom.dcmread(dicom_path, defer_size="4 KB", specific_tags=PIXEL_TAGS)
+        pixel_array = dcm.pixel_array
+
+        # Normalize pixel values to 0–255 (8-bit grayscale) in one float32 working
+        # copy, scaling in place instead of allocating float64 temporaries per step
+        lo, hi = float(pixel_array.min()), float(pixel_array.max())
+        scale = np.float32(255.0 / max(hi - lo, 1.0))
+        image = pixel_array.astype(np.float32)
+        image -= lo
+        image *= scale
+        # Round rather than truncate, so the brightest pixel lands on 255 and not 254
+        np.rint(image, out=image)
+        np.clip(image, 0, 255, out=image)
+        image = image.astype(np.uint8)
+
+        # Output filename (replace .dcm with .png)
+        output_filename = os.path.splitext(filename)[0] + ".png"
+        output_path = os.path.join(output_folder, output_filename)
+
+        # Save as PNG
+        Image.fromarray(image).save(output_path)
+        print(f"Saved: {output_path}")
+    except Exception as e:
+        print(f"Could not convert {filename}: {e}")
+
 def dicom_to_png(input_folder, output_folder):
     # Make sure output folder exists
     os.makedirs(output_folder, exist_ok=True)
 
-    for filename in os.listdir(input_folder):
-        if filename.lower().endswith(".dcm"):
-            dicom_path = os.path.join(input_folder, filename)
-            try:
-                # Read DICOM
-                dcm = pydicom.dcmread(dicom_path)
-                pixel_array = dcm.pixel_array
-
-                # Normalize pixel values to 0–255 (8-bit grayscale)
-                image = (pixel_array - np.min(pixel_array)) / (np.max(pixel_array) - np.min(pixel_array)) * 255.0
-                image = image.astype(np.uint8)
-
-                # Output filename (replace .dcm with .png)
-                output_filename = os.path.splitext(filename)[0] + ".png"
-                output_path = os.path.join(output_folder, output_filename)
-
-                # Save as PNG
-                Image.fromarray(image).save(output_path)
-                print(f"Saved: {output_path}")
-            except Exception as e:
-                print(f"Could not convert {filename}: {e}")
+    dicom_paths = [os.path.join(input_folder, filename) for filename in os.listdir(input_folder)
+                   if filename.lower().endswith(".dcm")]
+    if len(dicom_paths) <= 2:
+        for dicom_path in dicom_paths:
+            convert_dicom(dicom_path, output_folder)
+        return
+
+    # Threads, not processes: this runs inside the Tk app, where forking a multithreaded
+    # process is unsafe and spawn would re-import the GUI per worker. The heavy parts
+    # (pixel decode, numpy scaling, zlib in the PNG encoder) release the GIL, so slices overlap
+    with ThreadPoolExecutor(max_workers=min(len(dicom_paths), os.cpu_count() or 1)) as executor:
+        list(executor.map(convert_dicom, dicom_paths, repeat(output_folder)))
 
 def path(folder, id):
     full_name = f"{folder}patient_id_{id}"
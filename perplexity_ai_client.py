@@ -1,12 +1,56 @@
 import requests
-import json
-import base64
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
+try:
+    import pybase64 as base64  # SIMD encoder, same API as the stdlib module
+except ImportError:
+    import base64
+import functools
+import io
 import os
-from typing import Dict, Any
+import re
+from typing import Dict, Any, Callable, Optional
 import request_create_json as r
 from dotenv import load_dotenv
 load_dotenv()
 
+PERPLEXITY_URL = "https://api.perplexity.ai/chat/completions"
+API_KEY = os.getenv("PERPLEXITY_API_KEY")
+MAX_IMAGE_SIDE = 1568
+JPEG_QUALITY = 80
+
+# Response cleanup. Bold markers go first, since dropping them can join blanks or
+# expose a [n]; then one scan over each run of blanks and [n] references does the
+# old remove-references-then-collapse-blanks in a single pass
+BOLD_RE = re.compile(r"\*\*(.*?)\*\*")
+GAP_RE = re.compile(r"(?:[ \t]|\[\d+\])+")
+
+
+def clean_gap(m):
+    gap = m.group(0)
+    # A run with any blank in it collapses to one space; references alone just vanish
+    return " " if " " in gap or "\t" in gap else ""
+
+# Shared session so back-to-back submits reuse the TLS connection to the API.
+# POST is retried only where the completion cannot have run: connection failures, 429
+# and 503 (rejected before any work). read=0 so a timed-out or dropped response is never
+# re-sent (that would bill a duplicate completion); 500/502/504 are left out because the
+# upstream may already have generated, and billed, the answer
+session = requests.Session()
+session.headers.update({"Content-Type": "application/json"})
+if API_KEY:
+    session.headers["Authorization"] = f"Bearer {API_KEY}"
+session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    # Up to 3 connect/status retries (none on reads), exponential backoff with jitter so
+    # parallel clients don't retry in lockstep; a 429's Retry-After wins
+    max_retries=Retry(total=3, backoff_factor=0.5, backoff_jitter=0.3,
+                      read=0, status_forcelist=[429, 503],
+                      allowed_methods=frozenset({"POST"}), respect_retry_after_header=True),
+))
+
 def read_patient_history(patient_id: int) -> str:
     """
     Read patient history from the history file.
@@ -30,13 +74,83 @@ def read_patient_history(patient_id: int) -> str:
         print(f"Error reading history file: {e}")
         return ""
 
-def send_to_perplexity_ai(input_dict: Dict[str, Any], image_path: str) -> str:
+def sniff_image_mime(raw: bytes):
+    """Return the MIME type from the file signature, or None if it isn't PNG/JPEG/WebP."""
+    if raw[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if raw[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if raw[:4] == b"RIFF" and raw[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+@functools.lru_cache(maxsize=8)
+def image_data_url(image_path: str, mtime_ns: int, size: int) -> str:
+    """Return the image as a base64 data URL; mtime_ns and size only key the cache."""
+    # Pillow is only needed once an image is actually sent
+    from PIL import Image
+
+    # One fstat + one read on a raw fd; PIL then decodes from memory
+    fd = os.open(image_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        raw = os.read(fd, os.fstat(fd).st_size)
+    finally:
+        os.close(fd)
+
+    mime = sniff_image_mime(raw)
+    with Image.open(io.BytesIO(raw)) as img:
+        # Every uploaded byte costs 4/3 after base64, so cap the size at what the model
+        # actually looks at; an already compressed image that fits is sent untouched
+        if mime in ("image/jpeg", "image/webp") and max(img.size) <= MAX_IMAGE_SIDE:
+            data = raw
+        else:
+            if img.mode == "F" or img.mode.startswith("I"):
+                # 12/16-bit and float X-rays: stretch the actual value range onto 0-255;
+                # a plain convert("L") would clamp most of the image to white
+                img = img.convert("F" if img.mode == "F" else "I")
+                lo, hi = img.getextrema()
+                scale = 255.0 / max(hi - lo, 1)
+                img = img.point(lambda v: (v - lo) * scale).convert("L")
+            elif img.mode not in ("L", "RGB"):
+                img = img.convert("RGB")
+            img.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+            data = buffer.getbuffer()
+            mime = "image/jpeg"
+    # Assemble the data URL as bytes so there is a single str decode, not decode + f-string copy
+    image_url = bytearray(f"data:{mime};base64,".encode("ascii"))
+    image_url += base64.b64encode(data)
+    return image_url.decode("ascii")
+
+def read_stream(response, on_delta: Callable[[str], None]) -> str:
+    """Collect a server-sent-events completion, passing each content piece to on_delta as it arrives."""
+    parts = []
+    for line in response.iter_lines():
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            break
+        delta = orjson.loads(data)["choices"][0].get("delta", {}).get("content")
+        if delta:
+            parts.append(delta)
+            on_delta(delta)
+    return "".join(parts)
+
+def send_to_perplexity_ai(input_dict: Dict[str, Any], image_path: str, max_tokens: int = 1000,
+                          on_delta: Optional[Callable[[str], None]] = None,
+                          patient_id: Optional[int] = None) -> str:
     """
     Send a dictionary and image to Perplexity AI API and return the response.
 
     Args:
         input_dict (Dict[str, Any]): Dictionary containing input data to send to AI
         image_path (str): Path to the image file to send
+        max_tokens (int): Upper bound on the generated answer; lower it for short answers
+        on_delta (Callable[[str], None], optional): If given, the answer is streamed and each
+            raw text piece is passed to it as it arrives
+        patient_id (int, optional): Whose history to attach; defaults to the last fetched patient
 
     Returns:
         str: Cleaned AI response as a plain string
@@ -47,24 +161,22 @@ def send_to_perplexity_ai(input_dict: Dict[str, Any], image_path: str) -> str:
         requests.RequestException: If API request fails
     """
 
-    # Get API key from environment variable
-    api_key = os.getenv("PERPLEXITY_API_KEY")
-    if not api_key:
+    # API key is read once at import (after load_dotenv) and set on the session
+    if not API_KEY:
         raise ValueError("PERPLEXITY_API_KEY environment variable not set")
 
-    # Check if image file exists
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"Image file not found: {image_path}")
-
     # Encode image to base64
     try:
-        with open(image_path, "rb") as image_file:
-            image_data = base64.b64encode(image_file.read()).decode("utf-8")
+        # Re-submitting the same X-ray reuses the encoded URL until the file changes
+        stat = os.stat(image_path)
+        image_url = image_data_url(image_path, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Image file not found: {image_path}")
     except Exception as e:
         raise ValueError(f"Error reading image file: {e}")
 
     # Read patient history
-    patient_history = read_patient_history(r.ida)
+    patient_history = read_patient_history(r.ida if patient_id is None else patient_id)
     
     # Prepare the complete prompt including patient history
     complete_prompt = {
@@ -81,50 +193,46 @@ def send_to_perplexity_ai(input_dict: Dict[str, Any], image_path: str) -> str:
                 "content": [
                     {
                         "type": "text",
-                        "text": json.dumps(complete_prompt, indent=2)  # Send the complete prompt with history
+                        "text": orjson.dumps(complete_prompt).decode()  # Compact JSON; indentation only adds bytes and tokens
                     },
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/png;base64,{image_data}"
+                            "url": image_url
                         }
                     }
                 ]
             }
         ],
-        "max_tokens": 1000,
+        "max_tokens": max_tokens,
         "temperature": 0.1,
     }
-
-    # Set up headers
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
+    if on_delta is not None:
+        payload["stream"] = True
 
     # Make the API request
     try:
-        response = requests.post(
-            "https://api.perplexity.ai/chat/completions",
-            headers=headers,
-            json=payload,
+        response = session.post(
+            PERPLEXITY_URL,
+            # Pre-encoded with orjson; Content-Type and Authorization are set on the session
+            data=orjson.dumps(payload),
             timeout=30,
+            stream=on_delta is not None,
         )
         response.raise_for_status()
 
-        # Parse the response
-        ai_response = response.json()
+        if on_delta is not None:
+            ai_text = read_stream(response, on_delta)
+        else:
+            # Parse the response
+            ai_response = orjson.loads(response.content)
 
-        # Extract the AI's text response
-        ai_text = ai_response["choices"][0]["message"]["content"]
+            # Extract the AI's text response
+            ai_text = ai_response["choices"][0]["message"]["content"]
 
         # Clean up the response
-        import re
-
-        ai_text = re.sub(r"\*\*(.*?)\*\*", r"\1", ai_text)  # Remove bold formatting
-        ai_text = re.sub(r"\[\d+\]", "", ai_text)  # Remove reference numbers
-        ai_text = re.sub(r"[ \t]+", " ", ai_text)  # Replace multiple spaces/tabs
-        ai_text = ai_text.strip()
+        ai_text = BOLD_RE.sub(r"\1", ai_text)  # Remove bold formatting
+        ai_text = GAP_RE.sub(clean_gap, ai_text).strip()  # Remove reference numbers, collapse spaces/tabs
 
         return ai_text
 
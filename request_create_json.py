@@ -1,11 +1,26 @@
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
+import mmap
 import os
-import base64
-from make_png_from_dicom import change_to_png
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from pybase64 import b64decode as a2b_base64  # SIMD decoder when installed
+except ImportError:
+    from binascii import a2b_base64
 
 BASE_URL = "http://88.248.132.97:3333/lisapi/api/v1/Radiology/getPatientPacsImages"
 
+# Shared session so repeated patient fetches reuse the keep-alive connection;
+# everything goes to the one PACS host, so a single host pool is enough.
+# GETs are idempotent, so transient connection errors and 5xx are retried in place
+adapter = HTTPAdapter(pool_connections=1, pool_maxsize=16,
+                      max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]))
+session = requests.Session()
+session.mount("http://", adapter)
+session.mount("https://", adapter)
+
 
 # Set a default path to a sample JSON file (update this path as needed)
 path = "received_data/patient_id_unknown/sample_patient.json"  # Default; replace with a real path if available
@@ -18,12 +33,48 @@ def get_patient(patient_id: int):
     global ida
     ida = patient_id
     url = f"{BASE_URL}?patientId={patient_id}"
-    response = requests.get(url)
+    response = session.get(url, timeout=30)
     response.raise_for_status()
-    return response.json()
+    # The PACS payload carries base64 images; orjson parses it far faster than stdlib json
+    return orjson.loads(response.content)
+
+# Multiple of 4 so every slice is a whole number of base64 quanta
+BASE64_CHUNK = 64 * 1024
+
+def write_base64(file_data, out):
+    """Decode a base64 string into an open binary file in fixed-size slices."""
+    # Only one decoded slice is alive at a time instead of a full copy of the image
+    for start in range(0, len(file_data), BASE64_CHUNK):
+        out.write(a2b_base64(file_data[start:start + BASE64_CHUNK]))
+
+def save_image(folder_prefix, file_name, file_data):
+    """Decode one radiology file into the patient folder; returns an error message or None."""
+    if not file_data:
+        return f"Error saving {file_name}: no fileData"
+    # Line-wrapped (MIME style) base64 is legal; drop the whitespace so the length check
+    # and the 4-aligned slices see only base64 characters. An unwrapped string is returned as is
+    file_data = "".join(file_data.split())
+    # Unpadded/truncated payloads are rejected before any file is created or any decoding is done
+    if len(file_data) & 3:
+        return f"Error saving {file_name}: truncated base64 ({len(file_data)} chars)"
+    # Decode into a temp file and move it into place only once it is complete, so a bad
+    # payload never leaves an empty or half-written image behind (or replaces a good one)
+    target = folder_prefix + file_name
+    temp = target + ".part"
+    try:
+        with open(temp, "wb") as img_file:
+            write_base64(file_data, img_file)
+        os.replace(temp, target)
+        return None
+    except Exception as e:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        return f"Error saving {file_name}: {e}"
 
 def save_patient_data(data: dict, base_folder="received_data"):
-    """Save patient JSON and all radiology images into patient folder"""
+    """Save patient JSON and all radiology images into patient folder; fileData is removed from data"""
     global path
 
     if "patient" not in data:
@@ -50,31 +101,47 @@ def save_patient_data(data: dict, base_folder="received_data"):
     global image
     image = patient_folder
 
+    # One pass over radiologyImages: take each base64 payload out of the response and
+    # record where it will be written, so the JSON below stays small and the caller's
+    # dict doesn't keep the images alive
+    folder_prefix = os.path.join(patient_folder, "")  # joined once, not per file
+    # Keyed by target path so two entries with the same name (or two nameless ones)
+    # never have two workers writing one file; as in a sequential loop, the last one wins
+    files = {}
+    for study in data.get("radiologyImages", []):
+        for file_info in study.get("files", []):
+            file_name = file_info.get("fileName", "output.png")
+            file_data = file_info.pop("fileData", None)
+            key = os.path.normcase(file_name)
+            if file_data or key not in files:
+                files[key] = (file_name, file_data)
+            file_info["filePath"] = folder_prefix + file_name
+
     # --- Save JSON ---
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    # Minified: the file is only read back by analyze_json
+    with open(json_path, "wb") as f:
+        f.write(orjson.dumps(data))
     print(f"Saved patient JSON to {json_path}")
 
     # --- Save Images ---
-    if "radiologyImages" in data:
-        for study in data["radiologyImages"]:
-            for file_info in study.get("files", []):
-                file_name = file_info.get("fileName", "output.png")
-                file_data = file_info.get("fileData")
-                try:
-                    file_bytes = base64.b64decode(file_data)
-                    file_path = os.path.join(patient_folder, file_name)
-                    with open(file_path, "wb") as img_file:
-                        img_file.write(file_bytes)
-                    print(f"Saved image: {file_path}")
-                except Exception as e:
-                    print(f"Error saving {file_name}: {e}")
+    if files:
+        # Files are independent and decode/write release the GIL, so they overlap;
+        # only failures are printed per file, everything else goes into one summary line
+        with ThreadPoolExecutor(max_workers=min(16, len(files))) as pool:
+            errors = [e for e in pool.map(lambda f: save_image(folder_prefix, *f), files.values()) if e]
+        for error in errors:
+            print(error)
+        print(f"Saved {len(files) - len(errors)} of {len(files)} images to {patient_folder}")
 
     # --- Convert DICOM to PNG if needed ---
     try:
-        dcm_files = [f for f in os.listdir(patient_folder) if f.lower().endswith(".dcm")]
-        if dcm_files:
-            print(f"Found {len(dcm_files)} DICOM files. Starting conversion...")
+        # Count in one scandir pass; no name list is built just to take its length
+        with os.scandir(patient_folder) as entries:
+            dcm_count = sum(1 for entry in entries if entry.name.lower().endswith(".dcm") and entry.is_file())
+        if dcm_count:
+            # pydicom + numpy are only pulled in for patients that actually have DICOMs
+            from make_png_from_dicom import change_to_png
+            print(f"Found {dcm_count} DICOM files. Starting conversion...")
             change_to_png(pid)
             print("Conversion complete.")
     except Exception as e:
@@ -82,17 +149,19 @@ def save_patient_data(data: dict, base_folder="received_data"):
 
     return patient_folder
 
-def analyze_json():
+def analyze_json(json_path=None):
     """
-    Open JSON file and return all data except 'radiologyImages'.
+    Open JSON file (default: the last saved patient) and return all data except 'radiologyImages'.
     """
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    # Parse straight from the page cache; no userland copy of the file is made
+    with open(json_path or path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            data = orjson.loads(view)
 
-    # Copy everything except "radiologyImages"
-    result = {k: v for k, v in data.items() if k != "radiologyImages"}
+    # data is freshly parsed and private to this call, so drop the key in place
+    data.pop("radiologyImages", None)
 
-    return result
+    return data
 
 
 def setup(path_to_instructions="first_text.txt"):